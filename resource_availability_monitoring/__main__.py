@@ -1,17 +1,13 @@
 import logging
-import yaml
-from .job_factory import JobFactory
-from .job_scheduler import JobScheduler
-from .job_database import JobDatabase
-from .influx_db_writer import InfluxDBWriter
 import argparse
-import htcondor
 import shutil
+import signal
 
 # The line `from pathlib import Path` is importing the `Path` class from the `pathlib` module. The
 # `Path` class provides an object-oriented interface for working with file and directory paths. It
 # allows you to manipulate paths in a platform-independent way, regardless of the operating system.
 from pathlib import Path
+from .yaml_loader import load_yaml
 
 log = logging.getLogger(__name__)
 
@@ -114,22 +110,6 @@ def parse_args():
     return args
 
 
-def load_yaml(config_file):
-    """
-    The function `load_yaml` reads a YAML file and returns its contents as a Python dictionary.
-
-    Args:
-      config_file: The `config_file` parameter is a string that represents the file path of the YAML
-    configuration file that you want to load.
-
-    Returns:
-      the `config` object, which is the result of loading the YAML file.
-    """
-    with open(config_file) as f:
-        config = yaml.safe_load(f)
-    return config
-
-
 def setup_logging(log_file):
     """
     The function `setup_logging` sets up logging in Python, with logs being written to both the console
@@ -168,10 +148,9 @@ def get_enabled_job_config(config):
       an updated configuration dictionary that only includes the jobs that have the "enabled" parameter
     set to True.
     """
-    updated_config = {"jobs": []}
-    for job in config["jobs"]:
-        if job["parameters"]["enabled"]:
-            updated_config["jobs"].append(job)
+    updated_config = {
+        "jobs": [job for job in config["jobs"] if job["parameters"]["enabled"]]
+    }
     if len(updated_config["jobs"]) == 0:
         raise ValueError("No jobs enabled in config")
     return updated_config
@@ -179,7 +158,7 @@ def get_enabled_job_config(config):
 
 def calculate_number_of_required_workers(config):
     nworkers = sum(
-        [job["parameters"]["timeout"] / job["parameters"]["interval"] for job in config]
+        job["parameters"]["timeout"] / job["parameters"]["interval"] for job in config
     )
     return int(nworkers + 1)
 
@@ -199,7 +178,7 @@ def check_config(config_file):
     """
     config = load_yaml(config_file)
     enabled_job_config = get_enabled_job_config(config)["jobs"]
-    testjobs = [enabled_job_config[x]["name"] for x in range(len(enabled_job_config))]
+    testjobs = [job["name"] for job in enabled_job_config]
     log.info("Enabled jobs: %s", testjobs)
     log.info(
         "Maximum number of required workers: %s",
@@ -208,30 +187,51 @@ def check_config(config_file):
     return enabled_job_config
 
 
-def load_config_and_schedule_jobs(config_file, factory):
+def check_influxdb_config(influxdb_config_file):
+    """
+    The function `check_influxdb_config` loads the InfluxDB configuration file and checks that all
+    parameters required by the `InfluxDBWriter` are given, without connecting to InfluxDB.
+
+    Args:
+      influxdb_config_file: The `influxdb_config_file` parameter is the path to the YAML file with the
+    InfluxDB parameters.
+
+    Returns:
+      the InfluxDB configuration as a dictionary.
+    """
+    influxdb_config = load_yaml(influxdb_config_file)
+    if not isinstance(influxdb_config, dict):
+        raise ValueError(f"Invalid InfluxDB config in {influxdb_config_file}")
+    missing_keys = [
+        key for key in ("url", "token", "org", "bucket") if key not in influxdb_config
+    ]
+    if missing_keys:
+        raise ValueError(f"Missing InfluxDB parameters in config: {missing_keys}")
+    return influxdb_config
+
+
+def load_config_and_schedule_jobs(enabled_job_config, factory):
     """
-    The function loads a configuration file, checks the configuration, creates a job scheduler,
-    schedules jobs based on the configuration, and runs the scheduler.
+    The function creates a job scheduler, schedules jobs based on the already checked configuration,
+    and runs the scheduler.
 
     Args:
-      config_file: The `config_file` parameter is the file path or name of the configuration file that
-    contains the job configurations. This file is used to determine which jobs should be enabled and
-    their respective parameters.
+      enabled_job_config: The `enabled_job_config` parameter is the list of enabled jobs returned by
+    `check_config`, so the configuration file is not parsed a second time.
       factory: The "factory" parameter is an object or function that is responsible for creating and
     managing the jobs. It could be a class that implements the necessary methods for creating and
     running jobs, or it could be a function that takes in the job configuration and returns a job
     object. The specific implementation of the factory
     """
-    enabled_job_config = check_config(config_file)
+    from .job_scheduler import JobScheduler
+
     # start a job scheduler
     scheduler = JobScheduler(
         factory, num_workers=calculate_number_of_required_workers(enabled_job_config)
     )
-    for index, job in enumerate(enabled_job_config):
-        job_config = enabled_job_config[index]["parameters"]
-        job_name = enabled_job_config[index]["name"]
-        interval = job_config["interval"]
-        scheduler.schedule_job(job_config, job_name, interval)
+    for job in enabled_job_config:
+        job_config = job["parameters"]
+        scheduler.schedule_job(job_config, job["name"], job_config["interval"])
     scheduler.run()
 
 
@@ -246,7 +246,8 @@ def initialize_configs(configdir):
     """
     # if the configdir exists, and it is not empty, exit
     configdir = Path(configdir).absolute()
-    if Path(configdir).exists() and len(list(Path(configdir).iterdir())) > 0:
+    # any() stops at the first directory entry
+    if configdir.exists() and any(configdir.iterdir()):
         log.error(
             "Config directory %s already exists and is not empty. Exiting.", configdir
         )
@@ -255,7 +256,7 @@ def initialize_configs(configdir):
         "Initializing tool for the first time, setting up a default config in %s",
         configdir,
     )
-    Path(configdir).mkdir(parents=True, exist_ok=True)
+    configdir.mkdir(parents=True, exist_ok=True)
     default_config = Path(__file__).parent / "default_configuration"
     shutil.copytree(default_config, configdir, dirs_exist_ok=True)
     log.info("Default configuration copied to %s", configdir)
@@ -263,6 +264,15 @@ def initialize_configs(configdir):
     exit(0)
 
 
+def stop_on_sigterm(signum, frame):
+    """
+    The function `stop_on_sigterm` is used as the SIGTERM handler. It exits like a KeyboardInterrupt,
+    so the queued results are still written before the tool stops.
+    """
+    log.info("Received signal %s. Exiting.", signum)
+    exit(0)
+
+
 def main_cli():
     """
     The `main_cli()` function is the main entry point for a resource-monitoring tool that initializes
@@ -275,15 +285,28 @@ def main_cli():
     setup_logging(args.log_file)
     if args.initialize:
         initialize_configs(args.configdir)
-    # check if relevant config files exist
-    for relevant_file in [args.config_file, args.influxdb_config_file]:
-        if not Path(relevant_file).absolute().exists():
-            log.error("Not able to find %s. Exiting.", Path(relevant_file).absolute())
+    # check if relevant config files exist, all paths are already absolute after parsing
+    for relevant_file in (args.config_file, args.influxdb_config_file):
+        if not relevant_file.exists():
+            log.error("Not able to find %s. Exiting.", relevant_file)
             exit(1)
-    Path(args.workdir).absolute().mkdir(parents=True, exist_ok=True)
-    log.info("Using workdir: %s", Path(args.workdir).absolute())
+    enabled_job_config = check_config(args.config_file)
     if not args.no_influxdb:
-        influx_writer = InfluxDBWriter(load_yaml(args.influxdb_config_file))
+        influxdb_config = check_influxdb_config(args.influxdb_config_file)
+    if args.check:
+        log.info("Configuration check successful. Exiting.")
+        exit(0)
+    # htcondor and influxdb_client are slow to import and not needed to initialize or check the
+    # configuration, so they are only imported when the jobs are run
+    import htcondor
+    from .job_factory import JobFactory
+    from .job_database import JobDatabase
+    from .influx_db_writer import InfluxDBWriter
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    log.info("Using workdir: %s", args.workdir)
+    if not args.no_influxdb:
+        influx_writer = InfluxDBWriter(influxdb_config)
     else:
         influx_writer = None
     htcondor_schedd = htcondor.Schedd()
@@ -292,15 +315,18 @@ def main_cli():
         database,
         influx_writer,
         htcondor_schedd,
-        args.configdir.absolute(),
-        args.workdir.absolute(),
+        args.configdir,
+        args.workdir,
     )
-    if args.check:
-        check_config(args.config_file)
-        log.info("Configuration check successful. Exiting.")
-        exit(0)
-    factory.pickup_jobs()
-    load_config_and_schedule_jobs(args.config_file, factory)
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    try:
+        factory.pickup_jobs()
+        load_config_and_schedule_jobs(enabled_job_config, factory)
+    finally:
+        # write the queued test results and jobs before exiting
+        if influx_writer:
+            influx_writer.close()
+        database.close()
 
 
 # The `if __name__ == "__main__":` block is a common Python idiom that allows a module to be run as a
@@ -1,16 +1,55 @@
 import htcondor
-import yaml
-import time
 import os
+import time
 import logging
 from pathlib import Path
+from .yaml_loader import load_yaml
 
 log = logging.getLogger(__name__)
 
+# events after which the job is considered done
+_TERMINAL_EVENTS = frozenset(
+    {
+        htcondor.JobEventType.JOB_ABORTED,
+        htcondor.JobEventType.JOB_HELD,
+        htcondor.JobEventType.CLUSTER_REMOVE,
+    }
+)
+# We expect to see the first three events in this list, and allow
+# don't consider the others to be terminal.
+_EXPECTED_EVENTS = frozenset(
+    {
+        htcondor.JobEventType.SUBMIT,
+        htcondor.JobEventType.EXECUTE,
+        htcondor.JobEventType.IMAGE_SIZE,
+        htcondor.JobEventType.JOB_EVICTED,
+        htcondor.JobEventType.JOB_SUSPENDED,
+        htcondor.JobEventType.JOB_UNSUSPENDED,
+        htcondor.JobEventType.FILE_TRANSFER,
+    }
+)
+
 
 class HTCondorJob(object):
+    # projections of the schedd queries, they are the same for all jobs
+    _status_projection = ["ClusterId", "JobStatus"]
+    _pickup_projection = ["ClusterId", "LastJobStatus"]
+    _history_projection = [
+        "JobStatus",
+        "RemoteWallClockTime",
+        "RemoteUserCpu",
+        "RemoteSysCpu",
+    ]
+
     def __init__(
-        self, job_config, job_name, submission_time, schedd, configdir, workdir
+        self,
+        job_config,
+        job_name,
+        submission_time,
+        schedd,
+        configdir,
+        workdir,
+        submission_dict=None,
     ):
         self.job_config = job_config
         self.job_name = job_name
@@ -24,211 +63,232 @@ class HTCondorJob(object):
         )
         self.logs_folder.mkdir(parents=True, exist_ok=True)
         self.results_folder.mkdir(parents=True, exist_ok=True)
-        # now parse the job config and set defaults
-        self.parse_job_config()
+        # now parse the job config and set defaults, unless the submission dict of an earlier job
+        # with the same config is given
+        if submission_dict is not None:
+            self.submission_dict = submission_dict.copy()
+        else:
+            self.parse_job_config()
         self.timeout = self.job_config["timeout"]
         self.site = self.job_config["site"]
         self.submission_time = submission_time
-        self.cluster_id = -1
+        self.set_cluster_id(-1)
         self.runtime = -1
         self.cpu_efficiency = -1
         self.job_output = None
+        self.failed_tests = []
         self.last_event_type = None
         self.succeeded = False
         self.done_before_timeout = False
         self.schedd = schedd
+        # optional ScheddStatusCache shared between all jobs
+        self.status_cache = None
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        # Don't pickle the schedd
+        # Don't pickle the schedd and the status cache
         del state["schedd"]
+        state.pop("status_cache", None)
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
         # Add schedd back since it doesn't exist in the pickle
         self.schedd = htcondor.Schedd()
+        self.status_cache = None
+        # jobs pickled by older versions do not have all attributes yet
+        self.__dict__.setdefault("failed_tests", [])
+        if "_constraint" not in state:
+            self.set_cluster_id(self.cluster_id)
 
     def jobid(self):
         return f"{self.job_name}_{self.cluster_id}"
 
+    def set_cluster_id(self, cluster_id):
+        # the cluster id does not change after the submission, so the strings derived from it are
+        # built only once
+        self.cluster_id = cluster_id
+        self._cluster_id_str = str(cluster_id)
+        self._constraint = f"ClusterId == {cluster_id}"
+
     def parse_job_config(self):
-        self.submission_dict["executable"] = (
-            self.job_data_folder / self.job_config["job"]["executable"]
+        job = self.job_config["job"]
+        requirements = self.job_config["requirements"]
+        self.submission_dict["executable"] = str(
+            self.job_data_folder / job["executable"]
         )
-        self.submission_dict["arguments"] = self.job_config["job"]["arguments"]
-        self.submission_dict["AccountingGroup"] = self.job_config["job"][
-            "AccountingGroup"
-        ]
-        self.submission_dict["universe"] = self.job_config["job"]["universe"]
+        self.submission_dict["arguments"] = job["arguments"]
+        self.submission_dict["AccountingGroup"] = job["AccountingGroup"]
+        self.submission_dict["universe"] = job["universe"]
         if self.submission_dict["universe"] == "docker":
-            self.submission_dict["docker_image"] = self.job_config["job"][
-                "docker_image"
-            ]
+            self.submission_dict["docker_image"] = job["docker_image"]
         self.submission_dict["should_transfer_files"] = "YES"
         self.submission_dict["when_to_transfer_output"] = "ON_EXIT_OR_EVICT"
-        if "input_files" in self.job_config["job"].keys():
-            self.submission_dict["transfer_input_files"] = " ".join(
-                self.job_data_folder / self.job_config["job"]["input_files"]
+        if "input_files" in job:
+            # a single input file or a list of input files, located in the job data folder
+            input_files = job["input_files"]
+            if isinstance(input_files, str):
+                input_files = [input_files]
+            self.submission_dict["transfer_input_files"] = ",".join(
+                str(self.job_data_folder / input_file) for input_file in input_files
             )
-        self.submission_dict["transfer_output_files"] = self.job_config["job"][
-            "output_file"
-        ]
-        remap_string = (
-            f'"{self.job_config["job"]["output_file"]} = {self.result_file_path}"'
-        )
+        self.submission_dict["transfer_output_files"] = job["output_file"]
+        remap_string = f'"{job["output_file"]} = {self.result_file_path}"'
         self.submission_dict["transfer_output_remaps"] = remap_string
         self.submission_dict["output"] = str(
-            self.logs_folder / f"$(Cluster)_{self.job_config['job']['output']}"
+            self.logs_folder / f"$(Cluster)_{job['output']}"
         )
         self.submission_dict["error"] = str(
-            self.logs_folder / f"$(Cluster)_{self.job_config['job']['error']}"
-        )
-        self.submission_dict["log"] = str(
-            self.logs_folder / self.job_config["job"]["log"]
+            self.logs_folder / f"$(Cluster)_{job['error']}"
         )
-        self.submission_dict["request_cpus"] = self.job_config["requirements"]["cpu"]
-        self.submission_dict["request_memory"] = self.job_config["requirements"][
-            "memory"
-        ]
-        self.submission_dict["request_disk"] = self.job_config["requirements"]["disk"]
-        self.submission_dict["request_gpus"] = self.job_config["requirements"]["gpu"]
-        self.submission_dict["requirements"] = self.job_config["requirements"][
-            "requirements"
-        ]
+        self.submission_dict["log"] = str(self.logs_folder / job["log"])
+        self.submission_dict["request_cpus"] = requirements["cpu"]
+        self.submission_dict["request_memory"] = requirements["memory"]
+        self.submission_dict["request_disk"] = requirements["disk"]
+        self.submission_dict["request_gpus"] = requirements["gpu"]
+        self.submission_dict["requirements"] = requirements["requirements"]
 
     def submit_job(self):
         sub_obj = htcondor.Submit(self.submission_dict)
         sub_result = self.schedd.submit(sub_obj)
-        self.cluster_id = sub_result.cluster()
+        self.set_cluster_id(sub_result.cluster())
         log.info(
-            f"Submitted job with cluster id: {self.cluster_id} and a timeout of {self.timeout} seconds"
+            "Submitted job with cluster id: %s and a timeout of %s seconds",
+            self.cluster_id,
+            self.timeout,
         )
 
     def wait_for_job(self):
         jel = htcondor.JobEventLog(self.submission_dict["log"])
         true_timeout = self.submission_time + self.timeout
         while time.time() < true_timeout and not self.done_before_timeout:
-            for event in jel.events(stop_after=300):
+            # wait for new events only a few seconds, so the timeout is checked regularly
+            remaining = true_timeout - time.time()
+            for event in jel.events(stop_after=max(1, min(int(remaining), 5))):
                 if event.cluster != self.cluster_id or event.proc != 0:
                     continue
                 self.last_event_type = event.type
                 if event.type == htcondor.JobEventType.JOB_TERMINATED:
                     if event["TerminatedNormally"]:
                         log.info(
-                            f"Job {self.cluster_id} terminated normally with return value {event['ReturnValue']}."
+                            "Job %s terminated normally with return value %s.",
+                            self.cluster_id,
+                            event["ReturnValue"],
                         )
                         self.done_before_timeout = True
                         self.succeeded = True
                         return
                     else:
                         log.info(
-                            f"Job {self.cluster_id} terminated on signal {event['TerminatedBySignal']}."
+                            "Job %s terminated on signal %s.",
+                            self.cluster_id,
+                            event["TerminatedBySignal"],
                         )
                         self.done_before_timeout = True
                         return
 
-                elif event.type in {
-                    htcondor.JobEventType.JOB_ABORTED,
-                    htcondor.JobEventType.JOB_HELD,
-                    htcondor.JobEventType.CLUSTER_REMOVE,
-                }:
-                    log.info(f"Job {self.cluster_id} aborted, held, or removed.")
+                elif event.type in _TERMINAL_EVENTS:
+                    log.info("Job %s aborted, held, or removed.", self.cluster_id)
                     self.done_before_timeout = True
                     return
 
-                # We expect to see the first three events in this list, and allow
-                # don't consider the others to be terminal.
-                elif event.type not in {
-                    htcondor.JobEventType.SUBMIT,
-                    htcondor.JobEventType.EXECUTE,
-                    htcondor.JobEventType.IMAGE_SIZE,
-                    htcondor.JobEventType.JOB_EVICTED,
-                    htcondor.JobEventType.JOB_SUSPENDED,
-                    htcondor.JobEventType.JOB_UNSUSPENDED,
-                    htcondor.JobEventType.FILE_TRANSFER,
-                }:
+                elif event.type not in _EXPECTED_EVENTS:
                     log.info(
-                        f"Job {self.cluster_id} had unexpected event: {event.type}!"
+                        "Job %s had unexpected event: %s!", self.cluster_id, event.type
                     )
                     self.done_before_timeout = True
                     return
         else:
             log.info(
-                f"Timed out waiting for job {self.cluster_id} to finish! (Timeout {self.timeout} seconds)"
+                "Timed out waiting for job %s to finish! (Timeout %s seconds)",
+                self.cluster_id,
+                self.timeout,
             )
             # remove the job from the queue
-            self.schedd.act(
-                htcondor.JobAction.Remove, f"ClusterId == {self.cluster_id}"
-            )
+            self.schedd.act(htcondor.JobAction.Remove, self._constraint)
             self.done_before_timeout = False
 
+    def query_status(self):
+        # use the status cache shared between all jobs if available
+        if self.status_cache is not None:
+            status = self.status_cache.get_status(self.cluster_id)
+            return [] if status is None else [status]
+        return self.schedd.query(
+            constraint=self._constraint,
+            projection=self._status_projection,
+            limit=1,
+        )
+
+    def query_history(self, projection):
+        # use the status cache shared between all jobs if available
+        if self.status_cache is not None:
+            history = self.status_cache.get_history(self.cluster_id)
+            return [] if history is None else [history]
+        return self.schedd.history(
+            constraint=self._constraint,
+            projection=projection,
+            match=1,
+        )
+
     def report(self):
-        log.debug(f"    Job: {self.job_name}")
-        log.debug(f"    Cluster ID: {self.cluster_id}")
-        log.debug(f"    Status: {self.last_event_type}")
+        # the report only consists of debug messages, skip the schedd query otherwise
+        if not log.isEnabledFor(logging.DEBUG):
+            return
+        log.debug("    Job: %s", self.job_name)
+        log.debug("    Cluster ID: %s", self.cluster_id)
+        log.debug("    Status: %s", self.last_event_type)
         try:
-            current_htcondor_status = self.schedd.query(
-                constraint=f"ClusterId == {self.cluster_id}",
-                projection=["ClusterId", "JobStatus"],
-                limit=1,
-            )
+            current_htcondor_status = self.query_status()
         except Exception as e:
-            log.info(f"Could not get job status: {e}")
+            log.info("Could not get job status: %s", e)
             return
         if len(current_htcondor_status) == 0:
             log.debug("     HTCondor Job status: None")
         else:
             log.debug(
-                f"    HTCondor Job status: {current_htcondor_status[0]['JobStatus']}"
+                "    HTCondor Job status: %s", current_htcondor_status[0]["JobStatus"]
             )
 
     def is_job_still_running(self):
         # check if the job is still running on HTCondor
         try:
-            jobresult = self.schedd.query(
-                constraint=f"ClusterId == {self.cluster_id}",
-                projection=["ClusterId", "JobStatus"],
-                limit=1,
-            )
+            jobresult = self.query_status()
         except Exception as e:
             log.info(
-                f"Could not get job status: {e}, assuming job {self.cluster_id} is still running."
+                "Could not get job status: %s, assuming job %s is still running.",
+                e,
+                self.cluster_id,
             )
             return True
         if len(jobresult) == 0:
-            log.info(f"Job {self.cluster_id} not found on HTCondor")
+            log.info("Job %s not found on HTCondor", self.cluster_id)
             return False
         if len(jobresult) > 1:
             raise ValueError(
                 "More than one job found on HTCondor this should not happen!"
             )
         if jobresult[0]["JobStatus"] == 2:
-            log.info(f"Job {self.cluster_id} still running on HTCondor")
+            log.info("Job %s still running on HTCondor", self.cluster_id)
             return True
         else:
-            log.info(f"Job {self.cluster_id} running on HTCondor")
+            log.info("Job %s running on HTCondor", self.cluster_id)
             return False
 
     def finished_during_pickup(self):
         try:
-            for job in self.schedd.history(
-                constraint=f"ClusterId == {self.cluster_id}",
-                projection=["ClusterId", "LastJobStatus"],
-                match=1,
-            ):
-                log.info(f"Job {self.cluster_id} found in HTCondor history")
-                log.info(f"Job {self.cluster_id} status: {job['LastJobStatus']}")
+            for job in self.query_history(self._pickup_projection):
+                log.info("Job %s found in HTCondor history", self.cluster_id)
+                log.info("Job %s status: %s", self.cluster_id, job["LastJobStatus"])
                 if job["LastJobStatus"] == 4:
-                    log.info(f"Job {self.cluster_id} finished successfully")
+                    log.info("Job %s finished successfully", self.cluster_id)
                     self.done_before_timeout = True
                     self.succeeded = True
                 else:
-                    log.info(f"Job {self.cluster_id} did not finish successfully")
+                    log.info("Job %s did not finish successfully", self.cluster_id)
                     self.done_before_timeout = True
                     self.succeeded = False
         except Exception as e:
-            log.info(f"Could not get job status: {e}")
+            log.info("Could not get job status: %s", e)
             self.succeeded = False
 
     def parse_job_output(self):
@@ -242,23 +302,34 @@ class HTCondorJob(object):
             passed: False
             message: "Test 2 failed"
         """
-        # check if the results file exists
-        resultfiles = os.listdir(self.results_folder)
-        for resultfile in resultfiles:
-            if str(self.cluster_id) in resultfile:
-                with open(self.results_folder / resultfile) as f:
-                    self.job_output = yaml.safe_load(f)
+        # check if the results file exists, it is remapped to id_<cluster>-<process>-<output_file>
+        for resultfile in self.results_folder.glob(
+            f"id_{self._cluster_id_str}-*-{self.job_config['job']['output_file']}"
+        ):
+            self.job_output = load_yaml(resultfile)
+            break
         if self.job_output is None:
             log.info(
-                f"Could not find results file for {self.cluster_id} in {self.results_folder}"
+                "Could not find results file for %s in %s",
+                self.cluster_id,
+                self.results_folder,
             )
+        else:
+            # collect the messages of the failed tests once, they are needed for the result
+            self.failed_tests = [
+                test["message"]
+                for test in self.job_output["tests"]
+                if not test["passed"]
+            ]
 
     def has_passed(self):
         """Check if all tests in the job output have passed"""
-        if self.job_output and self.done_before_timeout and self.succeeded:
-            return all(test["passed"] for test in self.job_output["tests"])
-        else:
-            return False
+        return bool(
+            self.job_output
+            and self.done_before_timeout
+            and self.succeeded
+            and not self.failed_tests
+        )
 
     def message(self):
         message = ""
@@ -270,34 +341,17 @@ class HTCondorJob(object):
                 message += f" - Job did not succeed on HTCondor (last event type: {self.last_event_type})"
             if not self.job_output:
                 message += " - Job did not produce any output"
-            if self.job_output and not all(
-                test["passed"] for test in self.job_output["tests"]
-            ):
-                failed_tests = [
-                    test["message"]
-                    for test in self.job_output["tests"]
-                    if not test["passed"]
-                ]
-                message += f" - Tests failed: {failed_tests}"
+            if self.failed_tests:
+                message += f" - Tests failed: {self.failed_tests}"
         else:
             message = "Job succeeded"
         return message
 
     def get_condor_history_details(self):
         # get runtime and CPU efficiency
-        history_parameters = [
-            "JobStatus",
-            "RemoteWallClockTime",
-            "RemoteUserCpu",
-            "RemoteSysCpu",
-        ]
         self.history_results = {}
         try:
-            for job in self.schedd.history(
-                constraint=f"ClusterId == {self.cluster_id}",
-                projection=history_parameters,
-                match=1,
-            ):
+            for job in self.query_history(self._history_projection):
                 self.history_results = job
                 self.runtime = self.history_results["RemoteWallClockTime"]
                 try:
@@ -308,20 +362,21 @@ class HTCondorJob(object):
                 except ZeroDivisionError:
                     self.cpu_efficiency = 0
         except Exception as e:
-            log.info(f"Could not get job history: {e}")
+            log.info("Could not get job history: %s", e)
 
     def cleanup_outputs(self):
         # clean up the results and logs folders
-        deletions = [
-            self.logs_folder / logfile
-            for logfile in os.listdir(self.logs_folder)
-            if str(self.cluster_id) in logfile
-        ]
-        deletions += [
-            self.results_folder / resultfile
-            for resultfile in os.listdir(self.results_folder)
-            if str(self.cluster_id) in resultfile
-        ]
-        for file in deletions:
-            os.remove(file)
-        log.info(f"Cleaned up {len(deletions)} files for job {self.cluster_id}")
+        deletions = 0
+        for folder, prefix in (
+            (self.logs_folder, f"{self._cluster_id_str}_"),
+            (self.results_folder, f"id_{self._cluster_id_str}-"),
+        ):
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith(prefix):
+                        try:
+                            os.unlink(entry.path)
+                        except FileNotFoundError:
+                            continue
+                        deletions += 1
+        log.info("Cleaned up %s files for job %s", deletions, self.cluster_id)
@@ -1,31 +1,39 @@
-from influxdb_client import InfluxDBClient, Point
+from influxdb_client import InfluxDBClient, Point, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
 import logging
-import datetime
 import os
+import threading
+from collections import deque
 
 log = logging.getLogger(__name__)
 
+# the hostname does not change while the tool is running
+_HOSTNAME = os.uname().nodename
+
 
 class InfluxDBWriter(object):
-    def __init__(self, configuration) -> None:
+    def __init__(self, configuration, batch_size=100, flush_interval=10) -> None:
         self.url = configuration["url"]
         self.token = configuration["token"]
         self.org = configuration["org"]
         self.bucket = configuration["bucket"]
         try:
             self.client = InfluxDBClient(url=self.url, token=self.token, org=self.org)
+            # the write api is created once and shared by all writes
+            self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
             log.info("Connected to InfluxDB")
         except Exception as e:
             raise Exception("Failed to connect to InfluxDB: {}".format(e))
+        # queued points are written together, once batch_size points are pending or after
+        # flush_interval seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending_points = deque()
+        self._flush_requested = threading.Event()
+        thread = threading.Thread(target=self._write_pending_points, daemon=True)
+        thread.start()
 
-    def write_to_influxdb(self, measurement, data_dict):
-        log.info("Writing data to influxdb: {}".format(data_dict))
-        write_api = self.client.write_api(write_options=SYNCHRONOUS)
-        submission_time = datetime.datetime.fromtimestamp(
-            data_dict["submission_time"], datetime.timezone.utc
-        )
-        hostname = os.uname().nodename
+    def create_point(self, measurement, data_dict):
         data_point = (
             Point(measurement)
             .tag("test_name", data_dict["name"])
@@ -36,11 +44,40 @@ class InfluxDBWriter(object):
             .field("cpu_efficiency", float(data_dict["cpu_efficiency"]))
             .field("testtime", int(data_dict["testtime"]))
             .field("site", data_dict["site"])
-            .field("hostname", hostname)
-            .time(
-                submission_time.isoformat()
-            )  # the submission time of the job from the data_dict
+            .field("hostname", _HOSTNAME)
+            # the submission time of the job from the data_dict, as epoch nanoseconds
+            .time(int(data_dict["submission_time"] * 1_000_000_000), WritePrecision.NS)
         )
+        return data_point
+
+    def enqueue(self, measurement, data_dict):
+        log.info("Queueing data for influxdb: %s", data_dict)
+        self.pending_points.append(self.create_point(measurement, data_dict))
+        if len(self.pending_points) >= self.batch_size:
+            self._flush_requested.set()
+
+    def flush(self):
+        points = []
+        while True:
+            try:
+                points.append(self.pending_points.popleft())
+            except IndexError:
+                break
+        if len(points) == 0:
+            return
+        try:
+            self.write_api.write(self.bucket, self.org, points)
+            log.info("%s data points written to influxdb", len(points))
+        except Exception as e:
+            log.error("Failed to write %s data points: %s", len(points), e)
+
+    def close(self):
+        self.flush()
+        self.write_api.close()
+        self.client.close()
 
-        write_api.write(self.bucket, self.org, data_point)
-        log.info("Data written to influxdb")
+    def _write_pending_points(self):
+        while True:
+            self._flush_requested.wait(timeout=self.flush_interval)
+            self._flush_requested.clear()
+            self.flush()
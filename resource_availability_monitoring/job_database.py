@@ -2,63 +2,197 @@ import sqlite3
 from .condor_job import HTCondorJob
 import pickle
 import logging
-import copy
+import threading
+import queue
+import time
 from pathlib import Path
 
 log = logging.getLogger(__name__)
 
+# statements used at runtime, sqlite3 caches the prepared statement for each of them.
+# Existing jobs only get their status and object updated by the upsert, so a status update of a job
+# always ends up as a single row, even if the job itself was not written. The pickled object is
+# only needed to pick up unfinished jobs, so status updates drop it.
+_SQL_UPSERT_JOB = "INSERT INTO jobs VALUES (?, ?, ?, ?) ON CONFLICT(jobid) DO UPDATE SET status = excluded.status, object = excluded.object"
+_SQL_UPDATE_STATUS = "UPDATE jobs SET status = ?, object = NULL WHERE jobid = ?"
+_SQL_SELECT_ALL = "SELECT jobid, status, submissiontime FROM jobs"
+_SQL_ANY_UNFINISHED = "SELECT EXISTS(SELECT 1 FROM jobs WHERE status == 2)"
+_SQL_SELECT_UNFINISHED = (
+    "SELECT object FROM jobs WHERE status == 2 AND object IS NOT NULL"
+)
+_SQL_COUNT_JOBS = "SELECT COUNT(*) FROM jobs WHERE status >= 0"
+_SQL_DELETE_OLD_JOBS = "DELETE FROM jobs WHERE submissiontime < ?"
+
 
 # The JobDatabase class is used to manage a SQLite database for storing job information, including
 # initialization and cleanup of old jobs.
 class JobDatabase(object):
-    def __init__(self, sqlite_file):
+    def __init__(self, sqlite_file, write_batch_size=100, write_interval=0.5):
         """
-        The `__init__` function initializes an object with a given SQLite file, and then calls the
-        `initialize` and `cleanup_old_jobs` methods.
+        The `__init__` function initializes an object with a given SQLite file, opens a single
+        connection that is shared by all methods, starts the background thread that writes newly added
+        jobs, and then calls the `initialize` and `cleanup_old_jobs` methods.
 
         Args:
           sqlite_file: The `sqlite_file` parameter is the file path or name of the SQLite database file that
         will be used for storing data.
+          write_batch_size: The maximum number of added jobs that are inserted within one transaction.
+          write_interval: The maximum time in seconds an added job waits for further jobs to be
+        inserted together with it.
         """
         self.sqlite_file = Path(sqlite_file).absolute()
-        self.initialize()
+        is_new_database = not self.sqlite_file.exists()
+        # the connection is shared between the worker threads, so all access has to go through the lock
+        self.conn = sqlite3.connect(
+            self.sqlite_file, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        # added jobs are queued and inserted in batches by a background thread
+        self.write_batch_size = write_batch_size
+        self.write_interval = write_interval
+        self._write_queue = queue.Queue()
+        thread = threading.Thread(target=self._write_queued_jobs, daemon=True)
+        thread.start()
+        self.initialize(is_new_database)
         self.cleanup_old_jobs(retention_days=7)
 
-    def initialize(self):
+    def initialize(self, is_new_database):
         """
-        The `initialize` function checks if a SQLite database file exists, and if not, creates a new
-        database with a table called "jobs".
+        The `initialize` function tunes the shared connection via PRAGMAs, creates the table called
+        "jobs" if the SQLite database file did not exist before, and makes sure the indices on the
+        "jobs" table exist.
+
+        Args:
+          is_new_database: Whether the database file was newly created when opening the connection.
         """
-        if not self.sqlite_file.exists():
-            log.info("Creating new database at {}".format(self.sqlite_file))
-            conn = sqlite3.connect(self.sqlite_file)
-            c = conn.cursor()
-            c.execute(
-                """CREATE TABLE IF NOT EXISTS jobs
-                         (jobid text, status integer, submissiontime timestamp, object blob)"""
-            )
-            conn.commit()
-            conn.close()
+        with self._lock:
+            # WAL lets readers run concurrently to the writer and, together with synchronous=NORMAL,
+            # avoids an fsync on every single commit
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("PRAGMA temp_store=MEMORY")
+            self.conn.execute("PRAGMA cache_size=-64000")
+            self.conn.execute("PRAGMA mmap_size=268435456")
+        if is_new_database:
+            log.info("Creating new database at %s", self.sqlite_file)
+            with self._lock:
+                self.conn.execute(
+                    """CREATE TABLE IF NOT EXISTS jobs
+                         (jobid text PRIMARY KEY, status integer, submissiontime real, object blob)"""
+                )
         else:
-            log.debug("Database already exists at {}".format(self.sqlite_file))
+            log.debug("Database already exists at %s", self.sqlite_file)
             # self.dump_database()
+            self.ensure_unique_jobids()
+        # indices for the status lookups and the cleanup of old jobs, also added to existing databases
+        with self._lock:
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_subtime ON jobs(submissiontime)"
+            )
+
+    def ensure_unique_jobids(self):
+        """
+        The `ensure_unique_jobids` function adds a unique index on the job ID to databases created
+        before the job ID was the primary key, which is required for the upserts in `add_job`. Duplicated
+        job IDs are removed beforehand, keeping the latest entry.
+        """
+        with self._lock:
+            # the primary key of newer databases and the index added by an earlier run are both
+            # listed as unique indices
+            for index in self.conn.execute("PRAGMA index_list(jobs)").fetchall():
+                if not index[2]:
+                    continue
+                columns = self.conn.execute(
+                    "PRAGMA index_info('{}')".format(index[1])
+                ).fetchall()
+                if [column[2] for column in columns] == ["jobid"]:
+                    return
+            log.info("Adding unique index on jobid to %s", self.sqlite_file)
+            self.conn.execute(
+                "DELETE FROM jobs WHERE rowid NOT IN (SELECT MAX(rowid) FROM jobs GROUP BY jobid)"
+            )
+            self.conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_jobid ON jobs(jobid)"
+            )
+
+    def _write_queued_jobs(self):
+        """
+        The `_write_queued_jobs` function runs in a background thread. It collects the rows queued by
+        `add_job` until either `write_batch_size` rows are collected,
+        `write_interval` seconds have passed or a flush is requested, and upserts them within a single
+        transaction.
+        """
+        while True:
+            items = [self._write_queue.get()]
+            deadline = time.time() + self.write_interval
+            # None is queued by `flush` to request an immediate write
+            while items[-1] is not None and len(items) < self.write_batch_size:
+                try:
+                    items.append(
+                        self._write_queue.get(timeout=max(0, deadline - time.time()))
+                    )
+                except queue.Empty:
+                    break
+            rows = [item for item in items if item is not None]
+            try:
+                if len(rows) > 0:
+                    with self._lock:
+                        self.conn.execute("BEGIN")
+                        try:
+                            self.conn.executemany(_SQL_UPSERT_JOB, rows)
+                        except Exception:
+                            self.conn.execute("ROLLBACK")
+                            raise
+                        self.conn.execute("COMMIT")
+                    log.debug("Jobs written to database: %s", [row[0] for row in rows])
+            except Exception as e:
+                log.error("Failed to write %s jobs to database: %s", len(rows), e)
+            finally:
+                for _ in items:
+                    self._write_queue.task_done()
+
+    def flush(self):
+        """
+        The `flush` function blocks until all rows queued by `add_job` are written to the database.
+        """
+        self._write_queue.put(None)
+        self._write_queue.join()
+
+    def close(self):
+        """
+        The `close` function writes all queued jobs and closes the shared connection to the SQLite
+        database.
+        """
+        self.flush()
+        with self._lock:
+            self.conn.close()
+
+    def __del__(self):
+        if hasattr(self, "conn"):
+            self.conn.close()
 
     def dump_database(self):
         """
-        The function `dump_database` logs a debug message, connects to a SQLite database, executes a SELECT
-        query on the "jobs" table, logs the fetched results, and then closes the database connection.
+        The function `dump_database` logs a debug message, executes a SELECT query on the "jobs" table
+        and logs the fetched results. The pickled objects are not included, and nothing is queried
+        unless debug logging is enabled.
         """
+        if not log.isEnabledFor(logging.DEBUG):
+            return
         log.debug("Dumping db:")
-        conn = sqlite3.connect(self.sqlite_file)
-        c = conn.cursor()
-        c.execute("SELECT * FROM jobs")
-        log.debug(c.fetchall())
-        conn.close()
+        self.flush()
+        with self._lock:
+            jobs = self.conn.execute(_SQL_SELECT_ALL).fetchall()
+        log.debug(jobs)
 
     def add_job(self, job: HTCondorJob, status):
         """
         The `add_job` function adds a job object to a SQLite database, storing its job ID, status,
-        submission time, and a pickled version of the job object.
+        submission time, and a pickled version of the job object. The job is queued and written by a
+        background thread, all other methods first wait for queued jobs to be written.
 
         Args:
           job (HTCondorJob): The `job` parameter is an instance of the `HTCondorJob` class. It represents a
@@ -67,39 +201,63 @@ class JobDatabase(object):
         could be a string or any other data type that represents the job's status, such as "running",
         "completed", "failed", etc.
         """
-        conn = sqlite3.connect(self.sqlite_file)
         # convert the job object to a blob
-        log.debug("Adding job to database: {}".format(job.jobid()))
-        job_pickle = pickle.dumps(job)
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO jobs VALUES (?, ?, ?, ?)",
+        log.debug("Adding job to database: %s", job.jobid())
+        job_pickle = pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL)
+        # the submission time is stored as epoch seconds
+        self._write_queue.put(
             (
                 job.jobid(),
                 status,
-                job.submission_time,
+                float(job.submission_time),
                 job_pickle,
-            ),
+            )
         )
-        conn.commit()
-        log.debug("Job added to database: {}".format(job.jobid()))
-        conn.close()
 
     def update_job_status(self, job: HTCondorJob, status):
         """
-        The function updates the status of a job in an SQLite database.
+        The function updates the status of a job in an SQLite database and drops its pickled object,
+        which is only needed to pick up unfinished jobs. The queued jobs are written first, then the
+        status is upserted directly, so a failed write raises instead of only being logged by the
+        background thread, and the function returns once the status is written.
 
         Args:
           job (HTCondorJob): HTCondorJob - An object representing a job in HTCondor.
           status: The `status` parameter is the new status that you want to update for the given job. It
         represents the current state or progress of the job.
         """
-        conn = sqlite3.connect(self.sqlite_file)
-        c = conn.cursor()
-        c.execute("UPDATE jobs SET status = ? WHERE jobid = ?", (status, job.jobid()))
-        conn.commit()
-        log.debug(f"Updated job status of {job.jobid()} to {status}")
-        conn.close()
+        self.flush()
+        with self._lock:
+            self.conn.execute(
+                _SQL_UPSERT_JOB,
+                (job.jobid(), status, float(job.submission_time), None),
+            )
+        log.debug("Updated job status of %s to %s", job.jobid(), status)
+
+    def update_job_statuses(self, jobs, status):
+        """
+        The function updates the status of several jobs in an SQLite database within a single
+        transaction and drops their pickled objects.
+
+        Args:
+          jobs: A list of HTCondorJob objects whose status should be updated.
+          status: The `status` parameter is the new status that you want to update for all of the given
+        jobs.
+        """
+        if len(jobs) == 0:
+            return
+        self.flush()
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    _SQL_UPDATE_STATUS, [(status, job.jobid()) for job in jobs]
+                )
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        log.debug("Updated job status of %s jobs to %s", len(jobs), status)
 
     def are_jobs_unfinished(self):
         """
@@ -109,36 +267,25 @@ class JobDatabase(object):
           a boolean value. If there are any jobs in the database with a status 1, it will
         return True. Otherwise, it will return False.
         """
-        conn = sqlite3.connect(self.sqlite_file)
-        c = conn.cursor()
-        c.execute("SELECT * FROM jobs WHERE status == 2")
-        jobs = c.fetchall()
-        conn.close()
-        if len(jobs) > 0:
-            return True
-        else:
-            return False
+        self.flush()
+        with self._lock:
+            (unfinished,) = self.conn.execute(_SQL_ANY_UNFINISHED).fetchone()
+        return bool(unfinished)
 
     def get_unfinished_jobs(self):
         """
         The function retrieves unfinished jobs from a SQLite database and converts them into HTCondorJob
-        objects.
+        objects. Rows without a pickled object are skipped.
 
         Returns:
           a list of HTCondorJob objects that represent unfinished jobs in the database.
         """
-        conn = sqlite3.connect(self.sqlite_file)
-        c = conn.cursor()
-        c.execute("SELECT * FROM jobs WHERE status == 2")
-        jobs = c.fetchall()
-        conn.close()
-        job_objects = []
-
-        # need to convert the blob back to a HTCondorJob object
-        for job in jobs:
-            job_object = pickle.loads(job[3])
-            job_objects.append(copy.deepcopy(job_object))
-        return job_objects
+        # need to convert the blob back to a HTCondorJob object, unpickling already yields a new object.
+        # The rows are unpickled while iterating the cursor, so not all blobs are held in memory at once.
+        self.flush()
+        with self._lock:
+            cursor = self.conn.execute(_SQL_SELECT_UNFINISHED)
+            return [pickle.loads(row[0]) for row in cursor]
 
     def get_number_of_jobs(self):
         """
@@ -147,12 +294,10 @@ class JobDatabase(object):
         Returns:
           the total number of jobs in the database.
         """
-        conn = sqlite3.connect(self.sqlite_file)
-        c = conn.cursor()
-        c.execute("SELECT * FROM jobs WHERE status >= 0 ")
-        count = len(c.fetchall())
-        conn.close()
-        log.debug("Total number of jobs in database: {}".format(count))
+        self.flush()
+        with self._lock:
+            (count,) = self.conn.execute(_SQL_COUNT_JOBS).fetchone()
+        log.debug("Total number of jobs in database: %s", count)
         return count
 
     def cleanup_old_jobs(self, retention_days):
@@ -165,10 +310,8 @@ class JobDatabase(object):
         should be retained in the database. Any jobs that were submitted before `retention_days` days ago
         will be deleted from the `jobs` table.
         """
-        conn = sqlite3.connect(self.sqlite_file)
-        c = conn.cursor()
-        c.execute(
-            f"DELETE FROM jobs WHERE strftime('%Y-%m-%d', submissiontime) < strftime('%Y-%m-%d', datetime('now', '-{retention_days} day'))"
-        )
-        conn.commit()
-        conn.close()
+        # the submission time is stored as epoch seconds, a plain comparison can use the index
+        cutoff = time.time() - retention_days * 86400
+        self.flush()
+        with self._lock:
+            self.conn.execute(_SQL_DELETE_OLD_JOBS, (cutoff,))
@@ -1,7 +1,9 @@
 from .condor_job import HTCondorJob
+from .schedd_status_cache import ScheddStatusCache
 import time
 import logging
 import threading
+import queue
 
 log = logging.getLogger(__name__)
 
@@ -13,22 +15,35 @@ class JobFactory(object):
         self.htcondor_schedd = htcondor_schedd
         self.configdir = configdir
         self.workdir = workdir
-        self.unfinished_jobs = []
+        # unfinished jobs by job id, shared between the worker threads
+        self.unfinished_jobs = {}
+        self._jobs_lock = threading.Lock()
+        # set by the JobScheduler, shared by all jobs started afterwards
+        self.status_cache = None
+        # the submission dict only depends on the job config, so it is parsed once per job name
+        self.submission_dicts = {}
 
     def is_first_run(self):
         return self.database.get_number_of_jobs() == 0
 
+    def get_cluster_ids(self):
+        with self._jobs_lock:
+            return [job.cluster_id for job in self.unfinished_jobs.values()]
+
     def report(self):
+        # the report only consists of debug messages, skip the database and schedd queries otherwise
+        if not log.isEnabledFor(logging.DEBUG):
+            return
         log.debug("JobFactory report:")
-        log.debug(
-            "Number of jobs in database: {}".format(self.database.get_number_of_jobs())
-        )
-        log.debug("Unfinished jobs: {}".format(len(self.unfinished_jobs)))
-        for job in self.unfinished_jobs:
+        log.debug("Number of jobs in database: %s", self.database.get_number_of_jobs())
+        with self._jobs_lock:
+            unfinished_jobs = list(self.unfinished_jobs.values())
+        log.debug("Unfinished jobs: %s", len(unfinished_jobs))
+        for job in unfinished_jobs:
             job.report()
 
     def run_job(self, job_config, job_name):
-        log.info("Running job {}".format(job_name))
+        log.info("Running job %s", job_name)
         # create the job object
         job = HTCondorJob(
             job_config,
@@ -37,15 +52,21 @@ class JobFactory(object):
             self.htcondor_schedd,
             self.configdir,
             self.workdir,
+            self.submission_dicts.get(job_name),
         )
-        self.unfinished_jobs.append(job)
+        self.submission_dicts.setdefault(job_name, job.submission_dict)
         # run the job
         job.submit_job()
+        job.status_cache = self.status_cache
+        # the job id contains the cluster id, which is only known after the submission
+        with self._jobs_lock:
+            self.unfinished_jobs[job.jobid()] = job
         self.database.add_job(job, 2)  # 2 is the status for "Submitted"
         job.wait_for_job()
         self.collect_job_results(job)
         self.database.update_job_status(job, 1)  # 1 is the status for "Completed"
-        self.unfinished_jobs.remove(job)
+        with self._jobs_lock:
+            self.unfinished_jobs.pop(job.jobid(), None)
 
     def collect_job_results(self, job):
         # parse the job's output
@@ -53,14 +74,14 @@ class JobFactory(object):
         # get job results from history
         job.get_condor_history_details()
         test_total_duration = time.time() - job.submission_time
-        log.info("Job runtime: {}".format(job.runtime))
+        log.info("Job runtime: %s", job.runtime)
         results = self.construct_results(job, test_total_duration)
         if job.has_passed():
-            log.info("Job {} has passed".format(job.job_name))
+            log.info("Job %s has passed", job.job_name)
             job.cleanup_outputs()
-        # write the test results to influxdb
+        # queue the test results, they are written to influxdb in batches
         if self.influx_writer:
-            self.influx_writer.write_to_influxdb(
+            self.influx_writer.enqueue(
                 "testresults",
                 results,
             )
@@ -72,21 +93,76 @@ class JobFactory(object):
         if len(unfinished_jobs) == 0:
             log.info("No jobs to be picked up found in the database")
             return
-        # for each job in the database, start a new thread to pick it up
-        log.info("Picking up {} jobs".format(len(unfinished_jobs)))
-        for job in unfinished_jobs:
-            thread = threading.Thread(target=self.pickup_job, args=(job,))
-            thread.start()
+        log.info("Picking up %s jobs", len(unfinished_jobs))
+        # wait for the picked up jobs in the background, so scheduling of new jobs is not blocked.
+        # Jobs that are still waited for on shutdown keep their status and are picked up again.
+        thread = threading.Thread(
+            target=self.pickup_and_complete_jobs, args=(unfinished_jobs,), daemon=True
+        )
+        thread.start()
         return
 
-    def pickup_job(self, job):
-        self.unfinished_jobs.append(job)
+    def pickup_and_complete_jobs(self, jobs, status_batch_size=10):
+        # the picked up jobs share a status cache, so their queue status and history are queried
+        # with one schedd call for all of them instead of one per job
+        status_cache = self.status_cache
+        if status_cache is None:
+            status_cache = ScheddStatusCache(
+                self.htcondor_schedd, lambda: [job.cluster_id for job in jobs]
+            )
+        # pick up the jobs from the database using a bounded number of daemon threads. Unlike the
+        # threads of a ThreadPoolExecutor, they do not block the shutdown while waiting for jobs.
+        job_queue = queue.Queue()
+        for job in jobs:
+            job_queue.put(job)
+        finished_jobs = queue.Queue()
+        for i in range(min(32, len(jobs))):
+            thread = threading.Thread(
+                target=self.pickup_queued_jobs,
+                args=(job_queue, finished_jobs, status_cache),
+                daemon=True,
+            )
+            thread.start()
+        completed_jobs = []
+        for i in range(len(jobs)):
+            job, error = finished_jobs.get()
+            if error is not None:
+                log.error("Failed to pick up job: %s", error)
+            else:
+                completed_jobs.append(job)
+            # mark the completed jobs right away, so they are not picked up again after a restart,
+            # but share the transaction with jobs that finished at the same time.
+            # 1 is the status for "Completed"
+            if completed_jobs and (
+                len(completed_jobs) >= status_batch_size or finished_jobs.empty()
+            ):
+                self.database.update_job_statuses(completed_jobs, 1)
+                completed_jobs = []
+
+    def pickup_queued_jobs(self, job_queue, finished_jobs, status_cache):
+        while True:
+            try:
+                job = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self.pickup_job(job, status_cache)
+            except Exception as e:
+                finished_jobs.put((job, e))
+            else:
+                finished_jobs.put((job, None))
+
+    def pickup_job(self, job, status_cache):
+        job.status_cache = status_cache
+        with self._jobs_lock:
+            self.unfinished_jobs[job.jobid()] = job
         if job.is_job_still_running():
             job.wait_for_job()
         else:
             job.finished_during_pickup()
         self.collect_job_results(job)
-        self.database.update_job_status(job, 1)  # 1 is the status for "Completed"
+        with self._jobs_lock:
+            self.unfinished_jobs.pop(job.jobid(), None)
 
     def construct_results(self, job, test_total_duration):
         testresult = {
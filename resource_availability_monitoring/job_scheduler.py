@@ -1,49 +1,124 @@
-import schedule
+import heapq
+import itertools
 import threading
-import queue
 import time
+import queue
 import logging
+import functools
+from .schedd_status_cache import ScheddStatusCache
 
 log = logging.getLogger(__name__)
 
 
 class JobWorker(object):
-    def __init__(self, job_queue):
+    def __init__(self, job_queue, wake_event):
         self.job_queue = job_queue
+        self.wake_event = wake_event
 
     def run(self):
         while True:
             job = self.job_queue.get()
             job()
             self.job_queue.task_done()
+            # let the scheduler react to the finished job right away
+            self.wake_event.set()
 
 
 class JobScheduler(object):
     def __init__(self, job_factory, num_workers=1):
         self.num_workers = num_workers
+        # the queue is not bounded, a job that is due always runs eventually. Since a job is queued
+        # at most once, it holds at most one entry per scheduled job.
         self.job_queue = queue.Queue()
+        # names of the jobs waiting in the queue
+        self._queued_jobs = set()
+        self._queued_jobs_lock = threading.Lock()
         self.job_factory = job_factory
-        self.scheduler = schedule.Scheduler()
+        # heap of (next run, counter, interval, callable), the counter keeps the order of jobs with
+        # the same next run and avoids comparing the callables
+        self._heap = []
+        self._counter = itertools.count()
+        self._wake = threading.Event()
+        # one schedd query per tick for all jobs instead of one per job
+        self.status_cache = ScheddStatusCache(
+            job_factory.htcondor_schedd, job_factory.get_cluster_ids
+        )
+        self.job_factory.status_cache = self.status_cache
 
     def schedule_job(self, job_config, job_name, interval):
-        log.info(
-            "Scheduling job {} with interval {} seconds".format(job_name, interval)
-        )
-        self.scheduler.every(interval).seconds.do(
-            self.job_queue.put, (lambda: self.job_factory.run_job(job_config, job_name))
+        log.info("Scheduling job %s with interval %s seconds", job_name, interval)
+        heapq.heappush(
+            self._heap,
+            (
+                time.time() + interval,
+                next(self._counter),
+                interval,
+                functools.partial(self.enqueue_job, job_config, job_name),
+            ),
         )
 
+    def run_all(self):
+        # run all jobs right away and schedule their next run one interval from now
+        entries, self._heap = self._heap, []
+        for _, _, interval, job in entries:
+            job()
+            heapq.heappush(
+                self._heap, (time.time() + interval, next(self._counter), interval, job)
+            )
+
+    def run_pending(self):
+        # only the jobs at the top of the heap can be due
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            next_run, _, interval, job = heapq.heappop(self._heap)
+            job()
+            # keep the interval grid, unless the job is more than one interval late
+            next_run += interval
+            if next_run <= now:
+                next_run = now + interval
+            heapq.heappush(self._heap, (next_run, next(self._counter), interval, job))
+
+    def idle_seconds(self):
+        # seconds until the next job is due, or None if no job is scheduled
+        if not self._heap:
+            return None
+        return self._heap[0][0] - time.time()
+
+    def enqueue_job(self, job_config, job_name):
+        with self._queued_jobs_lock:
+            if job_name in self._queued_jobs:
+                log.warning(
+                    "Job %s is still waiting for a free worker, skipping", job_name
+                )
+                return
+            self.job_queue.put(functools.partial(self.run_job, job_config, job_name))
+            self._queued_jobs.add(job_name)
+
+    def run_job(self, job_config, job_name):
+        # the job left the queue, so the next tick may queue it again
+        with self._queued_jobs_lock:
+            self._queued_jobs.discard(job_name)
+        self.job_factory.run_job(job_config, job_name)
+
     def run(self):
-        log.info("Starting {} workers".format(self.num_workers))
+        log.info("Starting %s workers", self.num_workers)
+        # the workers do not block the shutdown, jobs that are still running keep their status in
+        # the database and are picked up again after a restart
         for i in range(self.num_workers):
-            thread = threading.Thread(target=JobWorker(self.job_queue).run)
+            thread = threading.Thread(
+                target=JobWorker(self.job_queue, self._wake).run, daemon=True
+            )
             thread.start()
         while True:
             if self.job_factory.is_first_run():
                 log.info("First run, running all jobs immediately once")
-                self.scheduler.run_all()
+                self.run_all()
             else:
                 log.debug("First run complete, running jobs on schedule")
                 self.job_factory.report()
-                self.scheduler.run_pending()
-            time.sleep(10)
+                self.run_pending()
+            # sleep until the next job is due or a worker finished a job
+            idle_seconds = self.idle_seconds()
+            timeout = 10 if idle_seconds is None else max(0, idle_seconds)
+            self._wake.wait(timeout=timeout)
+            self._wake.clear()
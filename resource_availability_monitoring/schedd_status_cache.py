@@ -0,0 +1,125 @@
+import threading
+import time
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def cluster_id_constraint(cluster_ids):
+    """
+    The function `cluster_id_constraint` builds a ClassAd constraint matching all given cluster ids.
+
+    Args:
+      cluster_ids: An iterable of HTCondor cluster ids.
+
+    Returns:
+      the constraint string, e.g. `member(ClusterId, {1, 2})`.
+    """
+    return "member(ClusterId, {{{}}})".format(
+        ", ".join(str(cluster_id) for cluster_id in cluster_ids)
+    )
+
+
+# The ScheddStatusCache class queries the status of all known jobs with a single schedd call and
+# shares the result between the jobs for a few seconds.
+class ScheddStatusCache(object):
+    status_projection = ["ClusterId", "JobStatus"]
+    history_projection = [
+        "ClusterId",
+        "JobStatus",
+        "LastJobStatus",
+        "RemoteWallClockTime",
+        "RemoteUserCpu",
+        "RemoteSysCpu",
+    ]
+
+    def __init__(self, schedd, get_cluster_ids, ttl=10):
+        """
+        The `__init__` function initializes the cache for a given schedd.
+
+        Args:
+          schedd: The HTCondor schedd to query.
+          get_cluster_ids: A function returning the cluster ids of all currently known jobs, which are
+        queried together.
+          ttl: The time in seconds for which the queue status is reused.
+        """
+        self.schedd = schedd
+        self.get_cluster_ids = get_cluster_ids
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._status = {}
+        self._queried_ids = set()
+        self._last_query = None
+        # history entries belong to finished jobs and do not change anymore
+        self._history = {}
+
+    def _cluster_ids(self, cluster_id):
+        cluster_ids = set(self.get_cluster_ids())
+        cluster_ids.add(cluster_id)
+        return cluster_ids
+
+    def get_status(self, cluster_id):
+        """
+        The `get_status` function returns the queue status of a job. If the cached status is older
+        than `ttl` seconds or the job was not part of the last query, the status of all known jobs is
+        queried again.
+
+        Args:
+          cluster_id: The cluster id of the job.
+
+        Returns:
+          a dict with the `status_projection` attributes, or None if the job is not in the queue.
+        """
+        with self._lock:
+            if (
+                self._last_query is None
+                or time.time() - self._last_query > self.ttl
+                or cluster_id not in self._queried_ids
+            ):
+                cluster_ids = self._cluster_ids(cluster_id)
+                log.debug("Querying queue status of %s jobs", len(cluster_ids))
+                jobs = self.schedd.query(
+                    constraint=cluster_id_constraint(cluster_ids),
+                    projection=self.status_projection,
+                )
+                self._status = {job["ClusterId"]: job for job in jobs}
+                self._queried_ids = cluster_ids
+                self._last_query = time.time()
+            return self._status.get(cluster_id)
+
+    def get_history(self, cluster_id):
+        """
+        The `get_history` function returns the history entry of a finished job. If it is not cached
+        yet, the history of the job is queried together with the other known jobs that were missing
+        from the last queue query and have no cached entry. Running jobs have no history entry, so
+        they are left out, otherwise the schedd would never reach the match count and scan its whole
+        history.
+
+        Args:
+          cluster_id: The cluster id of the job.
+
+        Returns:
+          a dict with the `history_projection` attributes, or None if the job is not in the history.
+        """
+        with self._lock:
+            if cluster_id not in self._history:
+                known_ids = self._cluster_ids(cluster_id)
+                # jobs that were no longer in the queue at the last queue query are finished
+                finished_ids = (
+                    self._queried_ids - self._status.keys() - self._history.keys()
+                ) & known_ids
+                finished_ids.add(cluster_id)
+                log.debug("Querying history of %s jobs", len(finished_ids))
+                for job in self.schedd.history(
+                    constraint=cluster_id_constraint(finished_ids),
+                    projection=self.history_projection,
+                    match=len(finished_ids),
+                ):
+                    self._history[job["ClusterId"]] = job
+                # forget the entries of jobs that are not known anymore
+                self._history = {
+                    key: value
+                    for key, value in self._history.items()
+                    if key in known_ids
+                }
+            return self._history.get(cluster_id)
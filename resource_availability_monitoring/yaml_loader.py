@@ -0,0 +1,23 @@
+import yaml
+
+# use the libyaml based loader if available, it is much faster than the pure python one
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def load_yaml(config_file):
+    """
+    The function `load_yaml` reads a YAML file and returns its contents as a Python dictionary.
+
+    Args:
+      config_file: The `config_file` parameter is a string that represents the file path of the YAML
+    configuration file that you want to load.
+
+    Returns:
+      the `config` object, which is the result of loading the YAML file.
+    """
+    with open(config_file) as f:
+        config = yaml.load(f, Loader=SafeLoader)
+    return config